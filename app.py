@@ -3,6 +3,9 @@ import streamlit as st
 import pandas as pd
 import firebase_admin
 from firebase_admin import credentials, firestore
+from image_cache import drive_file_id, get_image_cache, start_image_proxy
+from async_utils import load_findings_records
+from partitions import partition_selector, partition_version
 
 # ------------------------- COLORS -------------------------
 BG_MAIN = "#2e3a47"      # background για όλες τις σελίδες + header bar
@@ -222,24 +225,20 @@ if "splash_done" not in st.session_state:
     st.rerun()
 
 # --------- Φόρτωση δεδομένων από Firestore ----------
+# Cache ανά partition (season, site) – το version αλλάζει μετά από save
 @st.cache_data
-def load_findings():
+def load_findings(season, site=None, version=0):
     try:
-        docs = (
-            db.collection("findings")
-            .order_by("timestamp", direction=firestore.Query.DESCENDING)
-            .stream()
-        )
+        docs = load_findings_records(season, site)
     except Exception as e:
         st.error(f"Σφάλμα κατά τη σύνδεση με Firebase: {e}")
         return pd.DataFrame()
 
     data = []
-    for doc in docs:
-        d = doc.to_dict()
+    for d in docs:
         data.append(
             {
-                "id": doc.id,
+                "id": d["id"],
                 "coin_name": d.get("coin_name", ""),
                 "type": d.get("type", ""),
                 "period": d.get("period", ""),
@@ -255,11 +254,20 @@ def load_findings():
     return pd.DataFrame(data)
 
 
-findings = load_findings()
+GALLERY_WIDTH = 400  # variant της cache για τις κάρτες (4 ανά σειρά)
+
+
+def load_gallery_images(urls: tuple):
+    # από την τοπική cache στον δίσκο· μόνο τα misses πάνε στο Drive
+    return get_image_cache().get_many(urls, GALLERY_WIDTH)
+
 
 # --------- Sidebar Filters ----------
 st.sidebar.header("Φίλτρα")
 
+season, site = partition_selector(db)
+findings = load_findings(season, site, partition_version(season, site))
+
 selected_types = st.sidebar.multiselect(
     "Τύπος ευρήματος",
     ["coin", "sherd", "other"],
@@ -349,10 +357,34 @@ else:
         cols = st.columns(4)  # 4 κάρτες ανά σειρά
         max_photos = min(12, len(rows))
 
-        for idx, (_, row) in enumerate(rows.head(max_photos).iterrows()):
+        shown = rows.head(max_photos)
+        urls = tuple(u for u in shown["image_url"].astype(str) if u)
+
+        # Αν υπάρχει δημόσιο URL για το proxy, ο browser φορτώνει από εκεί
+        # (με μακροχρόνια cache)· αλλιώς στέλνουμε τα bytes από την cache.
+        proxy_url = st.secrets.get("image_proxy_url")
+        if proxy_url and start_image_proxy() is not None:
+            image_cache = get_image_cache()
+            image_cache.allow(drive_file_id(u) for u in urls)
+            fetched = {}
+            for u in urls:
+                file_id = drive_file_id(u)
+                if not file_id:
+                    continue
+                src = f"{proxy_url.rstrip('/')}/img/{file_id}?w={GALLERY_WIDTH}"
+                # η έκδοση στο URL αλλάζει όταν αλλάξει η εικόνα στο Drive
+                version = image_cache.version(file_id)
+                fetched[u] = f"{src}&v={version}" if version else src
+        else:
+            fetched = dict(zip(urls, load_gallery_images(urls)))
+
+        for idx, (_, row) in enumerate(shown.iterrows()):
             col = cols[idx % 4]
             with col:
-                img = row["image_url"] if row.get("image_url") else row.get("image_bytes")
+                if row.get("image_url"):
+                    img = fetched.get(row["image_url"]) or row["image_url"]
+                else:
+                    img = row.get("image_bytes")
                 st.markdown('<div class="av-card">', unsafe_allow_html=True)
                 st.image(img, use_column_width=True)
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,262 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import threading
+import uuid
+
+import firebase_admin
+import httpx
+import streamlit as st
+from google.auth.transport.requests import Request
+from google.cloud.firestore import AsyncClient
+from google.oauth2 import service_account
+
+from drive_utils import COINS_FOLDER_ID, SCOPES, SHERDS_FOLDER_ID
+from partitions import partition_query
+
+# -----------------------------------------------------
+# ΟΡΙΑ ΠΑΡΑΛΛΗΛΙΑΣ
+# -----------------------------------------------------
+FIRESTORE_CONCURRENCY = 8
+DRIVE_CONCURRENCY = 4
+IO_TIMEOUT = 60.0  # δευτερόλεπτα που περιμένει το script του Streamlit
+
+DRIVE_UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3/files"
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+
+
+# -----------------------------------------------------
+# EVENT LOOP σε δικό του thread: το Streamlit τρέχει το script
+# συγχρονικά, οπότε όλα τα async περνάνε από το run_sync().
+# -----------------------------------------------------
+class _IOContext:
+    """Clients και semaphores – δημιουργούνται μέσα στο background loop."""
+
+    def __init__(self):
+        # Δικός μας client (όχι firestore_async.client(), που κρατιέται
+        # στο firebase app) ώστε να ανήκει πάντα στο τρέχον loop.
+        app = firebase_admin.get_app()
+        self.db = AsyncClient(
+            project=app.project_id, credentials=app.credential.get_credential()
+        )
+        self.http = httpx.AsyncClient(
+            timeout=30.0,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=DRIVE_CONCURRENCY),
+        )
+        self.firestore_sem = asyncio.Semaphore(FIRESTORE_CONCURRENCY)
+        self.drive_sem = asyncio.Semaphore(DRIVE_CONCURRENCY)
+        self._creds = None
+        self._creds_lock = asyncio.Lock()
+
+    async def drive_headers(self):
+        async with self._creds_lock:
+            if self._creds is None:
+                self._creds = service_account.Credentials.from_service_account_info(
+                    dict(st.secrets["firebase_key"]), scopes=SCOPES
+                )
+            if not self._creds.valid:
+                # το refresh του google-auth είναι blocking
+                await asyncio.to_thread(self._creds.refresh, Request())
+            return {"Authorization": f"Bearer {self._creds.token}"}
+
+
+async def _new_context():
+    return _IOContext()
+
+
+@st.cache_resource
+def _io_runtime():
+    """Loop και context μαζί: ένα «Clear cache» τα ξαναφτιάχνει και τα δύο."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="av-async-io", daemon=True).start()
+    ctx = asyncio.run_coroutine_threadsafe(_new_context(), loop).result(IO_TIMEOUT)
+    return loop, ctx
+
+
+def run_sync(fn, *args, timeout: float = IO_TIMEOUT):
+    """
+    Τρέχει το coroutine fn(ctx, *args) στο background loop και περιμένει
+    το πολύ `timeout` δευτερόλεπτα (TimeoutError, και η εργασία ακυρώνεται).
+    """
+    loop, ctx = _io_runtime()
+    future = asyncio.run_coroutine_threadsafe(fn(ctx, *args), loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+# -----------------------------------------------------
+# FIRESTORE
+# -----------------------------------------------------
+async def _set_doc(ctx, doc_ref, data):
+    async with ctx.firestore_sem:
+        await doc_ref.set(data)
+
+
+async def _update_doc(ctx, doc_ref, data):
+    async with ctx.firestore_sem:
+        await doc_ref.update(data)
+
+
+async def load_findings_records_async(ctx, season: str, site: str = None):
+    query = partition_query(ctx.db, season, site)
+    async with ctx.firestore_sem:
+        return [{"id": doc.id, **doc.to_dict()} async for doc in query.stream()]
+
+
+# -----------------------------------------------------
+# GOOGLE DRIVE (REST μέσω httpx)
+# -----------------------------------------------------
+async def _upload_to_drive(ctx, file_bytes: bytes, name: str, mimetype: str, obj_type: str):
+    folder_id = COINS_FOLDER_ID if obj_type == "coin" else SHERDS_FOLDER_ID
+    metadata = {"name": name, "parents": [folder_id]}
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+        f"{json.dumps(metadata)}\r\n"
+        f"--{boundary}\r\n"
+        f"Content-Type: {mimetype}\r\n\r\n"
+    ).encode() + file_bytes + f"\r\n--{boundary}--\r\n".encode()
+
+    headers = await ctx.drive_headers()
+    headers["Content-Type"] = f"multipart/related; boundary={boundary}"
+    async with ctx.drive_sem:
+        resp = await ctx.http.post(
+            DRIVE_UPLOAD_URL,
+            params={"uploadType": "multipart", "fields": "id"},
+            headers=headers,
+            content=body,
+        )
+    resp.raise_for_status()
+    return resp.json()["id"]
+
+
+async def _delete_drive_file(ctx, file_id: str):
+    headers = await ctx.drive_headers()
+    async with ctx.drive_sem:
+        resp = await ctx.http.delete(f"{DRIVE_FILES_URL}/{file_id}", headers=headers)
+    resp.raise_for_status()
+
+
+async def _make_public(ctx, file_id: str):
+    headers = await ctx.drive_headers()
+    async with ctx.drive_sem:
+        resp = await ctx.http.post(
+            f"{DRIVE_FILES_URL}/{file_id}/permissions",
+            headers=headers,
+            json={"role": "reader", "type": "anyone"},
+        )
+    resp.raise_for_status()
+
+
+# -----------------------------------------------------
+# ΑΠΟΘΗΚΕΥΣΗ ΕΥΡΗΜΑΤΟΣ
+# -----------------------------------------------------
+async def _cleanup(ctx, doc_ref=None, file_id=None):
+    """Σβήνει ό,τι πρόλαβε να γραφτεί· λάθη εδώ δεν κρύβουν το αρχικό."""
+    if doc_ref is not None:
+        with contextlib.suppress(Exception):
+            await doc_ref.delete()
+    if file_id is not None:
+        with contextlib.suppress(Exception):
+            await _delete_drive_file(ctx, file_id)
+
+
+async def _write_finding(ctx, doc_ref, record: dict, uploaded_file, obj_type: str):
+    """Εγγραφή (+ upload)· σε αποτυχία καθαρίζει μόνο του. Επιστρέφει το file id."""
+    if uploaded_file is None:
+        await _set_doc(ctx, doc_ref, record)
+        return None
+
+    # return_exceptions: περιμένουμε και τα δύο να τελειώσουν, ώστε το
+    # cleanup να μη «συναντήσει» ένα set() που είναι ακόμη σε πτήση
+    file_id, written = await asyncio.gather(
+        _upload_to_drive(
+            ctx,
+            uploaded_file.getvalue(),
+            uploaded_file.name,
+            uploaded_file.type,
+            obj_type,
+        ),
+        _set_doc(ctx, doc_ref, {**record, "image_url": ""}),
+        return_exceptions=True,
+    )
+    upload_failed = isinstance(file_id, BaseException)
+    write_failed = isinstance(written, BaseException)
+    if upload_failed or write_failed:
+        await _cleanup(
+            ctx,
+            doc_ref=None if write_failed else doc_ref,
+            file_id=None if upload_failed else file_id,
+        )
+        raise file_id if upload_failed else written
+
+    file_url = f"https://drive.google.com/uc?id={file_id}"
+    results = await asyncio.gather(
+        _make_public(ctx, file_id),
+        _update_doc(ctx, doc_ref, {"image_url": file_url}),
+        return_exceptions=True,
+    )
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        await _cleanup(ctx, doc_ref=doc_ref, file_id=file_id)
+        raise errors[0]
+    return file_id
+
+
+async def _undo_finding(ctx, task, doc_ref):
+    """Περιμένει να τελειώσει ένα save που εγκαταλείφθηκε και το αναιρεί."""
+    try:
+        file_id = await task
+    except asyncio.CancelledError:
+        await _cleanup(ctx, doc_ref=doc_ref)
+    except Exception:
+        pass  # το _write_finding καθάρισε ήδη
+    else:
+        await _cleanup(ctx, doc_ref=doc_ref, file_id=file_id)
+
+
+# κρατάμε αναφορές ώστε τα undo tasks να μη μαζευτούν από τον GC
+_undo_tasks = set()
+
+
+async def save_finding_async(ctx, record: dict, uploaded_file=None, obj_type: str = "coin",
+                             collection: str = "findings") -> str:
+    """
+    Γράφει το εύρημα στο Firestore. Αν δοθεί αρχείο, το ανέβασμα στο Drive
+    τρέχει ταυτόχρονα με την εγγραφή και στο τέλος συμπληρώνεται το image_url.
+    Αν κάτι αποτύχει ή λήξει ο χρόνος (run_sync), σβήνονται και το έγγραφο
+    και το αρχείο στο Drive. Επιστρέφει το id του εγγράφου.
+    """
+    doc_ref = ctx.db.collection(collection).document()
+    task = asyncio.ensure_future(_write_finding(ctx, doc_ref, record, uploaded_file, obj_type))
+    try:
+        await asyncio.shield(task)
+    except asyncio.CancelledError:
+        # timeout: το save τελειώνει στο παρασκήνιο και αναιρείται, ώστε
+        # ένα retry να μη βρει μισό εύρημα ούτε να φτιάξει διπλό
+        undo = asyncio.ensure_future(_undo_finding(ctx, task, doc_ref))
+        _undo_tasks.add(undo)
+        undo.add_done_callback(_undo_tasks.discard)
+        with contextlib.suppress(asyncio.CancelledError):
+            await asyncio.shield(undo)
+        raise
+    return doc_ref.id
+
+
+# -----------------------------------------------------
+# SYNC FACADE για τις σελίδες του Streamlit
+# -----------------------------------------------------
+def save_finding(record: dict, uploaded_file=None, obj_type: str = "coin",
+                 collection: str = "findings") -> str:
+    return run_sync(save_finding_async, record, uploaded_file, obj_type, collection)
+
+
+def load_findings_records(season: str, site: str = None):
+    """Όλα τα έγγραφα ενός partition ως λίστα από dicts (με "id")."""
+    return run_sync(load_findings_records_async, season, site)
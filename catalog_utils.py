@@ -0,0 +1,329 @@
+import argparse
+import csv
+import json
+import os
+
+import cv2
+import numpy as np
+import streamlit as st
+
+# -----------------------------------------------------
+# ΚΑΤΑΛΟΓΟΣ ΑΝΑΦΟΡΑΣ (νομίσματα / όστρακα)
+#
+# Ο φάκελος CATALOG_DIR περιέχει (όλα τα .npy ανοίγουν με mmap):
+#   vocab_top.npy    1ο επίπεδο λεξιλογίου (B x 32 uint8, ORB bits)
+#   vocab_leaf.npy   2ο επίπεδο: B x B x 32 – λέξη = top * B + leaf
+#   idf.npy          βάρη idf ανά λέξη (K = B x B float32)
+#   inv_indptr.npy   inverted index: όρια λίστας ανά λέξη (K+1)
+#   inv_images.npy   inverted index: εικόνα αναφοράς ανά εγγραφή
+#   inv_weights.npy  inverted index: tf-idf βάρος ανά εγγραφή
+#   img_indptr.npy   όρια keypoints ανά εικόνα (N+1)
+#   kp_xy.npy        συντεταγμένες keypoints (M x 2 float32)
+#   desc.npy         ORB descriptors (M x 32 uint8)
+#   meta.json        coin_name / period / type / path ανά εικόνα
+# -----------------------------------------------------
+CATALOG_DIR = "catalog"
+
+MAX_SIDE = 640            # μέγιστη πλευρά εικόνας πριν το ORB
+QUERY_FEATURES = 500      # keypoints για τη φωτογραφία του χρήστη
+REF_FEATURES = 256        # keypoints ανά εικόνα αναφοράς (χώρος στο δίσκο)
+VOCAB_BRANCH = 128        # 2 επίπεδα x 128 = 16384 οπτικές λέξεις
+VOCAB_SAMPLE = 200_000    # δείγμα για το 1ο επίπεδο
+LEAF_SAMPLE = 20_000      # δείγμα ανά κόμβο για το 2ο επίπεδο
+VOCAB_ITERS = 8
+STOP_WORD_FRACTION = 0.05  # λέξεις σε >5% των εικόνων δεν μπαίνουν στο index
+
+TOP_CANDIDATES = 10       # πόσοι υποψήφιοι περνάνε σε γεωμετρικό έλεγχο
+RATIO = 0.8               # Lowe ratio test
+MIN_INLIERS = 12
+CONFIDENT_INLIERS = 40
+
+
+def _decode_gray(image_bytes: bytes):
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    scale = MAX_SIDE / max(img.shape[:2])
+    if scale < 1.0:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return img
+
+
+def _orb_features(img, n_features: int):
+    """Επιστρέφει (xy float32 N x 2, descriptors uint8 N x 32)."""
+    orb = cv2.ORB_create(nfeatures=n_features)
+    keypoints, desc = orb.detectAndCompute(img, None)
+    if desc is None or not keypoints:
+        return np.zeros((0, 2), np.float32), np.zeros((0, 32), np.uint8)
+    xy = np.array([kp.pt for kp in keypoints], dtype=np.float32)
+    return xy, desc
+
+
+def _to_signed(desc):
+    """Bits -> ±1, ώστε hamming = (256 - a·b) / 2 με ένα απλό matmul."""
+    return np.unpackbits(desc, axis=1).astype(np.float32) * 2.0 - 1.0
+
+
+def _quantize(desc, vocab_signed, chunk: int = 20_000):
+    words = np.empty(len(desc), dtype=np.int32)
+    for start in range(0, len(desc), chunk):
+        sims = _to_signed(desc[start:start + chunk]) @ vocab_signed.T
+        words[start:start + chunk] = np.argmax(sims, axis=1)
+    return words
+
+
+def _quantize_tree(desc, top_signed, leaf_signed):
+    """Λέξη στο δέντρο 2 επιπέδων: πρώτα κόμβος, μετά φύλλο μέσα σε αυτόν."""
+    top = _quantize(desc, top_signed)
+    words = np.empty(len(desc), dtype=np.int32)
+    for node in np.unique(top):
+        rows = np.nonzero(top == node)[0]
+        words[rows] = node * leaf_signed.shape[1] + _quantize(desc[rows], leaf_signed[node])
+    return words
+
+
+def _tfidf(words, idf):
+    """Κανονικοποιημένο (L2) tf-idf διάνυσμα ως (λέξεις, βάρη)."""
+    uniq, counts = np.unique(words, return_counts=True)
+    weights = (counts / counts.sum()) * idf[uniq]
+    norm = np.linalg.norm(weights)
+    if norm > 0:
+        weights = weights / norm
+    return uniq, weights.astype(np.float32)
+
+
+# -----------------------------------------------------
+# ΑΝΑΖΗΤΗΣΗ
+# -----------------------------------------------------
+class ReferenceCatalog:
+    def __init__(self, path: str):
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        self.top_signed = _to_signed(np.asarray(load("vocab_top.npy")))
+        leaf = np.asarray(load("vocab_leaf.npy"))
+        self.leaf_signed = _to_signed(leaf.reshape(-1, 32)).reshape(leaf.shape[0], leaf.shape[1], -1)
+        self.idf = np.asarray(load("idf.npy"))
+        self.inv_indptr = np.asarray(load("inv_indptr.npy"))
+        self.inv_images = load("inv_images.npy")
+        self.inv_weights = load("inv_weights.npy")
+        self.img_indptr = np.asarray(load("img_indptr.npy"))
+        self.kp_xy = load("kp_xy.npy")
+        self.desc = load("desc.npy")
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+
+    def _candidates(self, q_desc):
+        words, q_weights = _tfidf(
+            _quantize_tree(q_desc, self.top_signed, self.leaf_signed), self.idf
+        )
+        images, weights = [], []
+        for word, q_w in zip(words, q_weights):
+            start, end = self.inv_indptr[word], self.inv_indptr[word + 1]
+            if start == end:
+                continue
+            images.append(self.inv_images[start:end])
+            weights.append(self.inv_weights[start:end] * q_w)
+        if not images:
+            return []
+        scores = np.bincount(
+            np.concatenate(images),
+            weights=np.concatenate(weights),
+            minlength=len(self.meta),
+        )
+        k = min(TOP_CANDIDATES, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def _verify(self, q_xy, q_desc, ref):
+        start, end = self.img_indptr[ref], self.img_indptr[ref + 1]
+        ref_desc = np.asarray(self.desc[start:end])
+        if len(ref_desc) < 2:
+            return 0
+        ref_xy = np.asarray(self.kp_xy[start:end])
+
+        good = []
+        for pair in self.matcher.knnMatch(q_desc, ref_desc, k=2):
+            if len(pair) == 2 and pair[0].distance < RATIO * pair[1].distance:
+                good.append(pair[0])
+        if len(good) < MIN_INLIERS:
+            return 0
+
+        src = q_xy[[m.queryIdx for m in good]]
+        dst = ref_xy[[m.trainIdx for m in good]]
+        # Νομίσματα/όστρακα ≈ επίπεδα: αρκεί ομοιότητα (rotation + scale)
+        _, mask = cv2.estimateAffinePartial2D(
+            src, dst, method=cv2.RANSAC, ransacReprojThreshold=5.0
+        )
+        return int(mask.sum()) if mask is not None else 0
+
+    def match(self, image_bytes: bytes):
+        """
+        Βρίσκει την καλύτερη εικόνα αναφοράς για τη φωτογραφία.
+        Επιστρέφει dict με name/type/period/confidence ή None.
+        """
+        img = _decode_gray(image_bytes)
+        if img is None:
+            return None
+        q_xy, q_desc = _orb_features(img, QUERY_FEATURES)
+        if len(q_desc) < MIN_INLIERS:
+            return None
+
+        best, best_inliers = None, 0
+        for ref in self._candidates(q_desc):
+            inliers = self._verify(q_xy, q_desc, int(ref))
+            if inliers > best_inliers:
+                best, best_inliers = int(ref), inliers
+
+        if best is None or best_inliers < MIN_INLIERS:
+            return None
+
+        ref_meta = self.meta[best]
+        return {
+            "name": ref_meta.get("coin_name", ""),
+            "type": ref_meta.get("type", ""),
+            "period": ref_meta.get("period", ""),
+            "confidence": min(1.0, best_inliers / CONFIDENT_INLIERS),
+            "reference": ref_meta.get("path", ""),
+        }
+
+
+@st.cache_resource
+def load_catalog(path: str = CATALOG_DIR):
+    """Φορτώνει τον κατάλογο μία φορά ανά process (None αν δεν υπάρχει)."""
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    return ReferenceCatalog(path)
+
+
+# -----------------------------------------------------
+# ΔΗΜΙΟΥΡΓΙΑ ΚΑΤΑΛΟΓΟΥ (offline)
+# -----------------------------------------------------
+def _k_majority(desc, k: int, rng):
+    """k-majority clustering πάνω σε binary descriptors (k x 32 uint8)."""
+    centers = desc[rng.choice(len(desc), min(k, len(desc)), replace=False)].copy()
+    bits = np.unpackbits(desc, axis=1).astype(np.float32)
+
+    for _ in range(VOCAB_ITERS):
+        labels = _quantize(desc, _to_signed(centers))
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.zeros((len(centers), bits.shape[1]), dtype=np.float32)
+        np.add.at(sums, labels, bits)
+        filled = counts > 0
+        majority = sums[filled] / counts[filled, None] > 0.5
+        centers[filled] = np.packbits(majority, axis=1)
+
+    if len(centers) < k:
+        # λίγα δεδομένα: οι διπλές λέξεις απλώς δεν επιλέγονται ποτέ
+        centers = np.concatenate([centers, np.repeat(centers[:1], k - len(centers), axis=0)])
+    return centers
+
+
+def _build_vocab(desc, branch: int):
+    """Λεξιλόγιο-δέντρο 2 επιπέδων: (top B x 32, leaf B x B x 32)."""
+    rng = np.random.default_rng(0)
+    sample = desc
+    if len(desc) > VOCAB_SAMPLE:
+        sample = desc[rng.choice(len(desc), VOCAB_SAMPLE, replace=False)]
+    top = _k_majority(sample, branch, rng)
+
+    labels = _quantize(desc, _to_signed(top))
+    leaf = np.empty((branch, branch, desc.shape[1]), dtype=np.uint8)
+    for node in range(branch):
+        members = desc[labels == node]
+        if len(members) == 0:
+            leaf[node] = top[node]
+            continue
+        if len(members) > LEAF_SAMPLE:
+            members = members[rng.choice(len(members), LEAF_SAMPLE, replace=False)]
+        leaf[node] = _k_majority(members, branch, rng)
+    return top, leaf
+
+
+def build_catalog(manifest_csv: str, images_dir: str, out_dir: str = CATALOG_DIR):
+    """
+    Διαβάζει CSV με στήλες path, coin_name, period, type και γράφει
+    τον κατάλογο στο `out_dir`.
+    """
+    meta, all_xy, all_desc, img_indptr = [], [], [], [0]
+    with open(manifest_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            with open(os.path.join(images_dir, row["path"]), "rb") as img_file:
+                img = _decode_gray(img_file.read())
+            if img is None:
+                continue
+            xy, desc = _orb_features(img, REF_FEATURES)
+            meta.append(
+                {
+                    "path": row["path"],
+                    "coin_name": row.get("coin_name", ""),
+                    "period": row.get("period", ""),
+                    "type": row.get("type", ""),
+                }
+            )
+            all_xy.append(xy)
+            all_desc.append(desc)
+            img_indptr.append(img_indptr[-1] + len(desc))
+
+    kp_xy = np.concatenate(all_xy) if all_xy else np.zeros((0, 2), np.float32)
+    desc = np.concatenate(all_desc) if all_desc else np.zeros((0, 32), np.uint8)
+    if len(desc) == 0:
+        raise ValueError("No features extracted from the reference images.")
+
+    vocab_top, vocab_leaf = _build_vocab(desc, VOCAB_BRANCH)
+    leaf_signed = _to_signed(vocab_leaf.reshape(-1, 32)).reshape(VOCAB_BRANCH, VOCAB_BRANCH, -1)
+    words = _quantize_tree(desc, _to_signed(vocab_top), leaf_signed)
+    img_indptr = np.array(img_indptr, dtype=np.int64)
+    n_words = VOCAB_BRANCH * VOCAB_BRANCH
+
+    # idf: πόσες εικόνες περιέχουν κάθε λέξη
+    n_images = len(meta)
+    df = np.zeros(n_words, dtype=np.int64)
+    per_image = []
+    for i in range(n_images):
+        uniq = np.unique(words[img_indptr[i]:img_indptr[i + 1]])
+        df[uniq] += 1
+    idf = np.log((n_images + 1) / (df + 1)).astype(np.float32)
+    # stop words: πολύ συχνές λέξεις δεν ξεχωρίζουν εικόνες, μόνο μακραίνουν τις λίστες
+    if n_images >= 100:
+        idf[df > STOP_WORD_FRACTION * n_images] = 0.0
+
+    for i in range(n_images):
+        uniq, weights = _tfidf(words[img_indptr[i]:img_indptr[i + 1]], idf)
+        per_image.append((uniq, np.full(len(uniq), i, np.int32), weights))
+
+    inv_words = np.concatenate([p[0] for p in per_image])
+    inv_images = np.concatenate([p[1] for p in per_image])
+    inv_weights = np.concatenate([p[2] for p in per_image])
+    keep = inv_weights > 0
+    inv_words, inv_images, inv_weights = inv_words[keep], inv_images[keep], inv_weights[keep]
+    order = np.argsort(inv_words, kind="stable")
+    inv_indptr = np.concatenate(
+        [[0], np.cumsum(np.bincount(inv_words, minlength=n_words))]
+    ).astype(np.int64)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "vocab_top.npy"), vocab_top)
+    np.save(os.path.join(out_dir, "vocab_leaf.npy"), vocab_leaf)
+    np.save(os.path.join(out_dir, "idf.npy"), idf)
+    np.save(os.path.join(out_dir, "inv_indptr.npy"), inv_indptr)
+    np.save(os.path.join(out_dir, "inv_images.npy"), inv_images[order])
+    np.save(os.path.join(out_dir, "inv_weights.npy"), inv_weights[order])
+    np.save(os.path.join(out_dir, "img_indptr.npy"), img_indptr)
+    np.save(os.path.join(out_dir, "kp_xy.npy"), kp_xy)
+    np.save(os.path.join(out_dir, "desc.npy"), desc)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    return n_images
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the reference catalog index.")
+    parser.add_argument("manifest", help="CSV with path, coin_name, period, type")
+    parser.add_argument("images_dir", help="Folder with the reference images")
+    parser.add_argument("--out", default=CATALOG_DIR, help="Output catalog folder")
+    args = parser.parse_args()
+    count = build_catalog(args.manifest, args.images_dir, args.out)
+    print(f"Catalog built: {count} reference images -> {args.out}")
@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import math
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+from async_utils import run_sync
+
+# -----------------------------------------------------
+# GEOHASH: αποθηκεύεται σε κάθε εύρημα κατά την καταχώριση
+# ώστε να γίνονται range queries στο Firestore ανά prefix.
+# -----------------------------------------------------
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# 9 χαρακτήρες ≈ κελί 4.8m x 4.8m – αρκετό για επίπεδο τομής
+GEOHASH_PRECISION = 9
+# Πόσα prefix queries το πολύ στέλνουμε για μία αναζήτηση
+MAX_COVER_CELLS = 16
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEG_LAT = 111320.0
+
+# Πεδία που χρειάζονται τα αποτελέσματα (χωρίς image_bytes, για ταχύτητα)
+GEO_FIELDS = [
+    "coin_name",
+    "type",
+    "period",
+    "site_name",
+    "latitude",
+    "longitude",
+    "geohash",
+    "image_url",
+    "notes",
+    "timestamp",
+]
+
+
+def encode_geohash(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    """
+    Μετατρέπει latitude/longitude σε geohash με `precision` χαρακτήρες.
+    """
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    ch = 0
+    bits = 0
+    even = True  # τα ζυγά bits είναι longitude
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch = ch << 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch = ch << 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            ch = 0
+            bits = 0
+
+    return "".join(chars)
+
+
+def _cell_size(precision: int):
+    """Ύψος και πλάτος (σε μοίρες) ενός κελιού geohash."""
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lon_bits = total_bits - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def _cell_range(lo: float, hi: float, origin: float, step: float, count: int):
+    first = int(math.floor((lo - origin) / step))
+    last = int(math.floor((hi - origin) / step))
+    return max(first, 0), min(last, count - 1)
+
+
+def geohash_cover(min_lat, min_lon, max_lat, max_lon, max_cells: int = MAX_COVER_CELLS):
+    """
+    Επιστρέφει τα geohash prefixes που καλύπτουν το bounding box.
+    Διαλέγει τη μεγαλύτερη ακρίβεια που χωράει σε `max_cells` κελιά,
+    ώστε να στέλνουμε λίγα και στενά queries στο Firestore.
+    """
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_h, cell_w = _cell_size(precision)
+        n_rows = int(round(180.0 / cell_h))
+        n_cols = int(round(360.0 / cell_w))
+        row_lo, row_hi = _cell_range(min_lat, max_lat, -90.0, cell_h, n_rows)
+        col_lo, col_hi = _cell_range(min_lon, max_lon, -180.0, cell_w, n_cols)
+
+        n_cells = (row_hi - row_lo + 1) * (col_hi - col_lo + 1)
+        if n_cells > max_cells and precision > 1:
+            continue
+
+        prefixes = set()
+        for row in range(row_lo, row_hi + 1):
+            center_lat = -90.0 + (row + 0.5) * cell_h
+            for col in range(col_lo, col_hi + 1):
+                center_lon = -180.0 + (col + 0.5) * cell_w
+                prefixes.add(encode_geohash(center_lat, center_lon, precision))
+        return sorted(prefixes)
+
+    return []
+
+
+def radius_to_bbox(lat: float, lon: float, radius_m: float):
+    """
+    Bounding box (min_lat, min_lon, max_lat, max_lon) γύρω από έναν κύκλο.
+    Τα longitude μπορεί να βγουν εκτός [-180, 180] – βλ. split_bbox().
+    """
+    dlat = radius_m / METERS_PER_DEG_LAT
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlon = radius_m / (METERS_PER_DEG_LAT * cos_lat)
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def split_bbox(min_lat, min_lon, max_lat, max_lon):
+    """
+    Σπάει ένα box που περνάει τον μεσημβρινό ±180° σε δύο.
+    Δέχεται και min_lon > max_lon (box που «τυλίγεται»).
+    """
+    if max_lon - min_lon >= 360.0:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    # κανονικοποίηση στο [-180, 180)
+    min_lon = (min_lon + 180.0) % 360.0 - 180.0
+    max_lon = (max_lon + 180.0) % 360.0 - 180.0
+    if min_lon <= max_lon:
+        return [(min_lat, min_lon, max_lat, max_lon)]
+    return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+
+
+def cover_bbox(min_lat, min_lon, max_lat, max_lon, max_cells: int = MAX_COVER_CELLS):
+    """geohash_cover() για box που μπορεί να περνάει τον μεσημβρινό ±180°."""
+    boxes = split_bbox(min_lat, min_lon, max_lat, max_lon)
+    prefixes = set()
+    for box in boxes:
+        prefixes.update(geohash_cover(*box, max_cells=max(1, max_cells // len(boxes))))
+    return sorted(prefixes)
+
+
+# -----------------------------------------------------
+# FIRESTORE: prefix range queries πάνω στο πεδίο geohash,
+# σε όλα τα partitions (collection group "findings").
+# Τρέχουν παράλληλα μέσα από το async_utils (ίδιο όριο FIRESTORE_CONCURRENCY).
+# -----------------------------------------------------
+async def _fetch_prefix(ctx, prefix: str, collection: str):
+    query = (
+        ctx.db.collection_group(collection)
+        .where("geohash", ">=", prefix)
+        .where("geohash", "<=", prefix + "\uf8ff")
+        .select(GEO_FIELDS)
+    )
+    async with ctx.firestore_sem:
+        return [doc async for doc in query.stream()]
+
+
+async def _fetch_prefixes_async(ctx, prefixes, collection: str):
+    return await asyncio.gather(*(_fetch_prefix(ctx, p, collection) for p in prefixes))
+
+
+def _fetch_candidates(prefixes, collection: str = "findings"):
+    records = []
+    seen = set()
+    if not prefixes:
+        return records
+
+    for docs in run_sync(_fetch_prefixes_async, prefixes, collection):
+        for doc in docs:
+            if doc.id in seen:
+                continue
+            seen.add(doc.id)
+            d = doc.to_dict()
+            if d.get("latitude") is None or d.get("longitude") is None:
+                continue
+            records.append({"id": doc.id, **{f: d.get(f) for f in GEO_FIELDS}})
+    return records
+
+
+def findings_within_radius(lat: float, lon: float, radius_m: float) -> pd.DataFrame:
+    """
+    Ευρήματα σε απόσταση έως `radius_m` μέτρα από το σημείο (lat, lon),
+    ταξινομημένα κατά απόσταση (στήλη distance_m).
+    """
+    prefixes = cover_bbox(*radius_to_bbox(lat, lon, radius_m))
+    records = _fetch_candidates(prefixes)
+    if not records:
+        return pd.DataFrame(columns=["id", *GEO_FIELDS, "distance_m"])
+
+    # Ακριβές φιλτράρισμα με BallTree (haversine, σε ακτίνια)
+    coords = np.radians(
+        np.array([[r["latitude"], r["longitude"]] for r in records], dtype=float)
+    )
+    tree = BallTree(coords, metric="haversine")
+    idx, dist = tree.query_radius(
+        np.radians([[lat, lon]]),
+        r=radius_m / EARTH_RADIUS_M,
+        return_distance=True,
+        sort_results=True,
+    )
+
+    rows = []
+    for i, d in zip(idx[0], dist[0]):
+        row = dict(records[i])
+        row["distance_m"] = float(d * EARTH_RADIUS_M)
+        rows.append(row)
+    return pd.DataFrame(rows, columns=["id", *GEO_FIELDS, "distance_m"])
+
+
+def findings_in_bbox(min_lat, min_lon, max_lat, max_lon) -> pd.DataFrame:
+    """
+    Ευρήματα μέσα στο ορθογώνιο [min_lat, max_lat] x [min_lon, max_lon].
+    Με min_lon > max_lon το ορθογώνιο περνάει τον μεσημβρινό ±180°.
+    """
+    boxes = split_bbox(min_lat, min_lon, max_lat, max_lon)
+    records = _fetch_candidates(cover_bbox(min_lat, min_lon, max_lat, max_lon))
+    if not records:
+        return pd.DataFrame(columns=["id", *GEO_FIELDS])
+
+    coords = np.array([[r["latitude"], r["longitude"]] for r in records], dtype=float)
+    mask = np.zeros(len(coords), dtype=bool)
+    for b_min_lat, b_min_lon, b_max_lat, b_max_lon in boxes:
+        mask |= (
+            (coords[:, 0] >= b_min_lat)
+            & (coords[:, 0] <= b_max_lat)
+            & (coords[:, 1] >= b_min_lon)
+            & (coords[:, 1] <= b_max_lon)
+        )
+    rows = [r for r, keep in zip(records, mask) if keep]
+    return pd.DataFrame(rows, columns=["id", *GEO_FIELDS])
+
+
+def backfill_geohashes(db, collection: str = "findings") -> int:
+    """
+    Συμπληρώνει geohash σε παλιά ευρήματα που δεν το έχουν.
+    Επιστρέφει πόσα έγγραφα ενημερώθηκαν.
+    """
+    batch = db.batch()
+    pending = 0
+    updated = 0
+    docs = db.collection_group(collection).select(["latitude", "longitude", "geohash"]).stream()
+    for doc in docs:
+        d = doc.to_dict()
+        if d.get("geohash") or d.get("latitude") is None or d.get("longitude") is None:
+            continue
+        batch.update(doc.reference, {"geohash": encode_geohash(d["latitude"], d["longitude"])})
+        pending += 1
+        updated += 1
+        if pending == 400:  # όριο Firestore: 500 εγγραφές ανά batch
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return updated
+
+
+if __name__ == "__main__":
+    from partitions import init_firestore
+
+    parser = argparse.ArgumentParser(description="Geohash maintenance for findings.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill = sub.add_parser("backfill", help="Add geohash to findings that lack it")
+    backfill.add_argument("--key", help="Service account JSON (default: .streamlit/secrets.toml)")
+    args = parser.parse_args()
+
+    print(f"Added geohash to {backfill_geohashes(init_firestore(args.key))} findings")
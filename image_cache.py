@@ -0,0 +1,505 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import streamlit as st
+from PIL import Image, ImageOps
+
+# -----------------------------------------------------
+# ΤΟΠΙΚΗ CACHE ΕΙΚΟΝΩΝ ΑΠΟ ΤΟ GOOGLE DRIVE
+#
+# Στον δίσκο (CACHE_DIR):
+#   {file_id}_{width}.img   bytes εικόνας (width 0 = πρωτότυπο)
+#   {file_id}.json          etag / last_modified / content_type / checked_at
+# Όταν γεμίσει (MAX_CACHE_BYTES) σβήνονται τα λιγότερο πρόσφατα (LRU).
+# -----------------------------------------------------
+CACHE_DIR = ".image_cache"
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+REVALIDATE_AFTER = 24 * 3600           # δευτερόλεπτα πριν το conditional GET
+ORIGIN_URL = "https://drive.google.com/uc?id={file_id}"
+VARIANT_WIDTHS = (200, 400, 800)       # επιτρεπτά πλάτη (αλλιώς πρωτότυπο)
+FETCH_WORKERS = 8
+
+PROXY_PORT = 8600
+BROWSER_MAX_AGE = 365 * 24 * 3600
+
+_DRIVE_ID = re.compile(r"[?&]id=([\w-]+)")
+_FILE_ID = re.compile(r"[\w-]+")
+
+
+def drive_file_id(url: str):
+    """Το file id από ένα URL τύπου https://drive.google.com/uc?id=..."""
+    match = _DRIVE_ID.search(url or "")
+    return match.group(1) if match else None
+
+
+def _variant(width: int) -> int:
+    """Στρογγυλεύει προς τα πάνω στο κοντινότερο επιτρεπτό πλάτος."""
+    for allowed in VARIANT_WIDTHS:
+        if 0 < width <= allowed:
+            return allowed
+    return 0
+
+
+def _sniff_type(data: bytes, default: str = "application/octet-stream") -> str:
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return default
+
+
+def _resize(data: bytes, width: int) -> bytes:
+    # EXIF orientation (φωτογραφίες κινητού) εφαρμόζεται στα pixels,
+    # αφού το save παρακάτω δεν κρατάει το tag
+    img = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    if img.width <= width:
+        return data
+    img.thumbnail((width, img.height))
+    out = BytesIO()
+    if img.mode in ("RGBA", "LA", "P"):
+        img.save(out, format="PNG", optimize=True)
+    else:
+        img.convert("RGB").save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+class ImageCache:
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES,
+                 origin_url: str = ORIGIN_URL, allow_any: bool = False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.origin_url = origin_url
+        self.allow_any = allow_any      # μόνο για offline δοκιμές
+        self._allowed = set()            # file ids που εμφανίζει η εφαρμογή
+        self._http = httpx.Client(timeout=30.0, follow_redirects=True)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (file_id, width) -> size, σε σειρά LRU
+        self._total = 0
+        self._inflight = {}              # single-flight: key -> Future
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    # ---------- αρχεία ----------
+    def _path(self, file_id: str, width: int) -> str:
+        return os.path.join(self.root, f"{file_id}_{width}.img")
+
+    def _meta_path(self, file_id: str) -> str:
+        return os.path.join(self.root, f"{file_id}.json")
+
+    def _read_meta(self, file_id: str):
+        try:
+            with open(self._meta_path(file_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, file_id: str, meta: dict):
+        tmp = self._meta_path(file_id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path(file_id))
+
+    def _load_index(self):
+        """Ξαναχτίζει το LRU από τον δίσκο (σειρά κατά mtime)."""
+        found = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".img"):
+                continue
+            file_id, _, width = name[:-4].rpartition("_")
+            stat = os.stat(os.path.join(self.root, name))
+            found.append((stat.st_mtime, (file_id, int(width)), stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+
+        # meta χωρίς καμία εικόνα (π.χ. από παλιό eviction)
+        known = {file_id for file_id, _ in self._entries}
+        for name in os.listdir(self.root):
+            if name.endswith(".json") and name[:-5] not in known:
+                self._remove_file(os.path.join(self.root, name))
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _remove_variants(self, keys):
+        """Σβήνει τα αρχεία και το meta όσων file ids δεν έχουν πια variant."""
+        for key in keys:
+            self._remove_file(self._path(*key))
+        for file_id in {k[0] for k in keys}:
+            if not self._has_any(file_id):
+                self._remove_file(self._meta_path(file_id))
+
+    # ---------- LRU ----------
+    def _read(self, key):
+        """Bytes από τον δίσκο ή None· σε hit το key γίνεται το πιο πρόσφατο."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(*key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(*key))
+            return data
+        except OSError:
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+            return None
+
+    def _store(self, key, data: bytes):
+        tmp = self._path(*key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(*key))
+
+        evicted = []
+        with self._lock:
+            self._total += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total -= size
+                evicted.append(old_key)
+        self._remove_variants(evicted)
+
+    def _drop(self, file_id: str):
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == file_id]
+            for key in keys:
+                self._total -= self._entries.pop(key)
+        self._remove_variants(keys)
+
+    def _has_any(self, file_id: str) -> bool:
+        with self._lock:
+            return any(k[0] == file_id for k in self._entries)
+
+    # ---------- single-flight ----------
+    def _single_flight(self, key, fn, *args):
+        """Ταυτόχρονα αιτήματα για το ίδιο key περιμένουν την ίδια κλήση."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    # ---------- origin ----------
+    def _fetch_original(self, file_id: str, need_bytes: bool):
+        """
+        GET στο origin. Αν έχουμε ήδη κάτι στην cache στέλνουμε
+        If-None-Match / If-Modified-Since και σε 304 απλώς ανανεώνουμε.
+        """
+        meta = self._read_meta(file_id) or {}
+        have_original = self._read((file_id, 0)) is not None if need_bytes else self._has_any(file_id)
+        headers = {}
+        if meta and have_original:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        resp = self._http.get(self.origin_url.format(file_id=file_id), headers=headers)
+        now = time.time()
+        if resp.status_code == 304:
+            meta["checked_at"] = now
+            self._write_meta(file_id, meta)
+            return
+        resp.raise_for_status()
+
+        # νέα έκδοση: τα παλιά variants δεν ισχύουν πια
+        self._drop(file_id)
+        self._store((file_id, 0), resp.content)
+        self._write_meta(
+            file_id,
+            {
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "content_type": resp.headers.get("Content-Type", _sniff_type(resp.content)),
+                "checked_at": now,
+            },
+        )
+
+    def _ensure_fresh(self, file_id: str):
+        meta = self._read_meta(file_id)
+        if meta and self._has_any(file_id) and time.time() - meta.get("checked_at", 0) < REVALIDATE_AFTER:
+            return
+        self._single_flight(("origin", file_id), self._fetch_original, file_id, False)
+
+    def _original_bytes(self, file_id: str) -> bytes:
+        data = self._read((file_id, 0))
+        if data is None:
+            self._single_flight(("full", file_id), self._fetch_original, file_id, True)
+            data = self._read((file_id, 0))
+        return data
+
+    def _build_variant(self, file_id: str, width: int) -> bytes:
+        data = self._read((file_id, width))
+        if data is None:
+            data = _resize(self._original_bytes(file_id), width)
+            self._store((file_id, width), data)
+        return data
+
+    # ---------- δημόσιο API ----------
+    def allow(self, file_ids):
+        """Δηλώνει file ids ευρημάτων που επιτρέπεται να σερβίρει το proxy."""
+        with self._lock:
+            self._allowed.update(f for f in file_ids if f)
+
+    def is_known(self, file_id: str) -> bool:
+        """Το proxy σερβίρει μόνο ids ευρημάτων ή ids που είναι ήδη στην cache."""
+        if self.allow_any:
+            return True
+        with self._lock:
+            if file_id in self._allowed:
+                return True
+        return self._has_any(file_id)
+
+    def version(self, file_id: str):
+        """
+        Σύντομο αναγνωριστικό της τρέχουσας έκδοσης του πρωτοτύπου (από
+        ETag / Last-Modified), για versioned URLs· None αν δεν το ξέρουμε.
+        """
+        meta = self._read_meta(file_id)
+        if not meta or not (meta.get("etag") or meta.get("last_modified")):
+            return None
+        token = f"{meta.get('etag')}|{meta.get('last_modified')}"
+        return hashlib.sha1(token.encode()).hexdigest()[:12]
+
+    def get(self, file_id: str, width: int = 0):
+        """
+        Επιστρέφει (bytes, content_type, etag) για το file id στο πλάτος
+        `width` (0 = πρωτότυπο). Repeat views σερβίρονται από τον δίσκο.
+        """
+        if not _FILE_ID.fullmatch(file_id or ""):
+            raise ValueError(f"Invalid file id: {file_id!r}")
+        width = _variant(width)
+        self._ensure_fresh(file_id)
+
+        if width == 0:
+            data = self._original_bytes(file_id)
+            content_type = (self._read_meta(file_id) or {}).get("content_type")
+        else:
+            data = self._read((file_id, width))
+            if data is None:
+                data = self._single_flight((file_id, width), self._build_variant, file_id, width)
+            content_type = None
+
+        etag = '"' + hashlib.sha1(data).hexdigest()[:20] + '"'
+        return data, content_type or _sniff_type(data), etag
+
+    def get_many(self, urls, width: int = 0):
+        """Bytes για πολλά Drive URLs παράλληλα (None όπου αποτύχει)."""
+        def one(url):
+            file_id = drive_file_id(url)
+            if not file_id:
+                return None
+            try:
+                return self.get(file_id, width)[0]
+            except (httpx.HTTPError, OSError, ValueError):
+                return None
+
+        urls = list(urls)
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(urls))) as pool:
+            return list(pool.map(one, urls))
+
+
+# -----------------------------------------------------
+# PROXY SERVER: GET /img/{file_id}?w=400&v=<version>
+#
+# Μόνο URLs με την τρέχουσα έκδοση (v) παίρνουν immutable cache· χωρίς v
+# ή με παλιό v ο browser ξαναρωτάει (no-cache + ETag → 304).
+# -----------------------------------------------------
+class _ProxyHandler(BaseHTTPRequestHandler):
+    cache = None
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        match = re.fullmatch(r"/img/([\w-]+)", parsed.path)
+        # όχι αυθαίρετα αρχεία του Drive: μόνο όσα ανήκουν σε ευρήματα
+        if not match or not self.cache.is_known(match.group(1)):
+            self.send_error(404)
+            return
+        query = parse_qs(parsed.query)
+        try:
+            width = int(query.get("w", ["0"])[0])
+        except ValueError:
+            self.send_error(400, "Invalid width")
+            return
+
+        try:
+            data, content_type, etag = self.cache.get(match.group(1), width)
+        except httpx.HTTPStatusError as e:
+            self.send_error(e.response.status_code if e.response.status_code == 404 else 502)
+            return
+        except (httpx.HTTPError, OSError):
+            self.send_error(502)
+            return
+
+        requested = query.get("v", [None])[0]
+        if requested and requested == self.cache.version(match.group(1)):
+            cache_control = f"public, max-age={BROWSER_MAX_AGE}, immutable"
+        else:
+            cache_control = "no-cache"
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_proxy_server(cache: ImageCache, host: str = "127.0.0.1", port: int = PROXY_PORT):
+    handler = type("ProxyHandler", (_ProxyHandler,), {"cache": cache})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="av-image-proxy", daemon=True).start()
+    return server
+
+
+@st.cache_resource
+def get_image_cache():
+    return ImageCache()
+
+
+@st.cache_resource
+def start_image_proxy():
+    """
+    Ξεκινά το proxy μία φορά ανά process, πάνω στην κοινή cache.
+    Ακούει μόνο τοπικά (πίσω από reverse proxy)· None αν πιαστεί η θύρα.
+    """
+    try:
+        return start_proxy_server(get_image_cache())
+    except OSError:
+        return None
+
+
+# -----------------------------------------------------
+# STAND-IN ORIGIN για offline δοκιμές: σερβίρει αρχεία από έναν
+# φάκελο σαν το Drive (/uc?id=... -> redirect -> αρχείο, με ETag).
+# -----------------------------------------------------
+class _OriginHandler(BaseHTTPRequestHandler):
+    folder = "."
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path == "/uc":
+            file_id = parse_qs(parsed.query).get("id", [""])[0]
+            self.send_response(303)
+            self.send_header("Location", f"/files/{file_id}")
+            self.end_headers()
+            return
+
+        match = re.fullmatch(r"/files/([\w-]+)", parsed.path)
+        path = os.path.join(self.folder, match.group(1)) if match else None
+        if not path or not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        with open(path, "rb") as f:
+            data = f.read()
+        mtime = int(os.path.getmtime(path))
+        etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+
+        not_modified = self.headers.get("If-None-Match") == etag
+        since = self.headers.get("If-Modified-Since")
+        if not not_modified and since and "If-None-Match" not in self.headers:
+            try:
+                not_modified = mtime <= parsedate_to_datetime(since).timestamp()
+            except (TypeError, ValueError):
+                pass
+
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", _sniff_type(data))
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_origin_server(folder: str, host: str = "127.0.0.1", port: int = 8601):
+    handler = type("OriginHandler", (_OriginHandler,), {"folder": folder})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="av-origin", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Image proxy cache / offline origin.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    origin = sub.add_parser("origin", help="Serve a folder as a stand-in for Drive")
+    origin.add_argument("folder")
+    origin.add_argument("--port", type=int, default=8601)
+
+    proxy = sub.add_parser("proxy", help="Run the image proxy cache")
+    proxy.add_argument("--host", default="127.0.0.1")
+    proxy.add_argument("--port", type=int, default=PROXY_PORT)
+    proxy.add_argument("--cache-dir", default=CACHE_DIR)
+    proxy.add_argument("--origin", default=ORIGIN_URL, help="URL template with {file_id}")
+    proxy.add_argument("--allow-any", action="store_true",
+                       help="Serve any file id (offline testing only)")
+
+    args = parser.parse_args()
+    if args.command == "origin":
+        server = start_origin_server(args.folder, port=args.port)
+        print(f"Origin: http://127.0.0.1:{args.port}/uc?id=<file> from {args.folder}")
+    else:
+        server = start_proxy_server(
+            ImageCache(args.cache_dir, origin_url=args.origin, allow_any=args.allow_any),
+            host=args.host,
+            port=args.port,
+        )
+        print(f"Proxy: http://{args.host}:{args.port}/img/<file_id>?w=400")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
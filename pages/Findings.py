@@ -3,6 +3,20 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from datetime import datetime
 import pandas as pd
+from geo_utils import encode_geohash, findings_within_radius
+from catalog_utils import load_catalog
+from async_utils import load_findings_records, save_finding
+from partitions import (
+    active_season,
+    bump_partition,
+    list_seasons,
+    list_sites,
+    partition_path,
+    partition_selector,
+    partition_version,
+    register_partition,
+    site_key,
+)
 
 # ------------------------
 # PAGE CONFIG
@@ -93,39 +107,45 @@ st.markdown(
 )
 
 # ------------------------
-# FAKE AI CLASSIFIER (DEMO)
+# AI: ΤΑΙΡΙΑΣΜΑ ΜΕ ΚΑΤΑΛΟΓΟ ΑΝΑΦΟΡΑΣ
 # ------------------------
+# Cache στα bytes της εικόνας: το rerun σε κάθε πεδίο της φόρμας
+# δεν ξανατρέχει ORB + ταίριασμα.
+@st.cache_data(show_spinner=False, max_entries=32)
 def ai_suggest_fields(image_bytes: bytes):
     """
-    Demo AI – αργότερα εδώ βάζετε το πραγματικό σας μοντέλο.
-    Τώρα επιστρέφει απλά κάποιες ενδεικτικές τιμές.
+    Ταιριάζει τη φωτογραφία με τον κατάλογο αναφοράς (catalog_utils).
+    Αν δεν έχει φτιαχτεί κατάλογος, επιστρέφει τις demo τιμές.
     """
     if not image_bytes:
         return None
 
+    catalog = load_catalog()
+    if catalog is not None:
+        match = catalog.match(image_bytes)
+        if match:
+            match["source"] = "catalog"
+        return match
+
     return {
         "name": "Unknown coin",
         "type": "coin",
         "period": "Roman",
         "confidence": 0.65,
+        "source": "demo",
     }
 
 # ------------------------
 # ΒΟΗΘΗΤΙΚΟ: Φόρτωση ευρημάτων
 # ------------------------
 @st.cache_data
-def load_findings():
-    docs = (
-        db.collection("findings")
-        .order_by("timestamp", direction=firestore.Query.DESCENDING)
-        .stream()
-    )
+def load_findings(season, site=None, version=0):
+    docs = load_findings_records(season, site)
     data = []
-    for doc in docs:
-        d = doc.to_dict()
+    for d in docs:
         data.append(
             {
-                "id": doc.id,
+                "id": d["id"],
                 "coin_name": d.get("coin_name", ""),
                 "type": d.get("type", ""),
                 "period": d.get("period", ""),
@@ -200,11 +220,19 @@ if st.session_state["show_new_form"]:
                 st.write(f"**Προτεινόμενος τύπος:** {ai_result.get('type', '')}")
                 st.write(f"**Προτεινόμενη περίοδος:** {ai_result.get('period', '')}")
                 conf = ai_result.get("confidence", None)
-                if conf is not None:
-                    st.write(f"**Βεβαιότητα AI (demo):** {int(conf * 100)}%")
-                st.caption(
-                    "⚠ Demo AI – οι τιμές είναι ενδεικτικές και μπορούν να διορθωθούν από τους μαθητές."
-                )
+                if ai_result.get("source") == "catalog":
+                    if conf is not None:
+                        st.write(f"**Βεβαιότητα ταιριάσματος:** {int(conf * 100)}%")
+                    st.caption(
+                        f"Εικόνα αναφοράς: {ai_result.get('reference', '')} – "
+                        "οι τιμές μπορούν να διορθωθούν από τους μαθητές."
+                    )
+                else:
+                    if conf is not None:
+                        st.write(f"**Βεβαιότητα AI (demo):** {int(conf * 100)}%")
+                    st.caption(
+                        "⚠ Demo AI – οι τιμές είναι ενδεικτικές και μπορούν να διορθωθούν από τους μαθητές."
+                    )
 
     type_options = ["coin", "sherd", "other"]
     default_type = "coin"
@@ -243,30 +271,57 @@ if st.session_state["show_new_form"]:
         if uploaded_file is None or image_bytes is None:
             st.error("Πρέπει πρώτα να ανεβάσεις ή να βγάλεις μία φωτογραφία.")
         else:
-            db.collection("findings").add(
-                {
-                    "coin_name": coin_name,
-                    "type": finding_type,
-                    "period": period,
-                    "site_name": site_name,
-                    "latitude": latitude,
-                    "longitude": longitude,
-                    "image_bytes": image_bytes,
-                    "image_url": "",
-                    "notes": notes,
-                    "timestamp": datetime.utcnow(),
-                }
-            )
-            st.success("✅ Το εύρημα αποθηκεύτηκε επιτυχώς!")
-            st.session_state["show_new_form"] = False
-            st.experimental_rerun()
+            season = active_season()
+            site = site_key(site_name)
+            try:
+                # η φωτογραφία πάει στο Drive παράλληλα με την εγγραφή στο Firestore
+                save_finding(
+                    {
+                        "coin_name": coin_name,
+                        "type": finding_type,
+                        "period": period,
+                        "site_name": site_name,
+                        "latitude": latitude,
+                        "longitude": longitude,
+                        "geohash": encode_geohash(latitude, longitude),
+                        "notes": notes,
+                        "timestamp": datetime.utcnow(),
+                        "season": season,
+                        "site_key": site,
+                    },
+                    uploaded_file=uploaded_file,
+                    obj_type=finding_type,
+                    collection=partition_path(season, site),
+                )
+            except Exception as e:
+                st.error(f"⚠️ Σφάλμα κατά την αποθήκευση του ευρήματος: {e}")
+            else:
+                # το εύρημα έχει ήδη αποθηκευτεί: η φόρμα κλείνει σε κάθε
+                # περίπτωση, ώστε ένα δεύτερο πάτημα να μη φτιάξει διπλό
+                bump_partition(season, site)
+                st.session_state["show_new_form"] = False
+                try:
+                    register_partition(db, season, site, site_name)
+                except Exception as e:
+                    st.warning(
+                        "Το εύρημα αποθηκεύτηκε, αλλά δεν ενημερώθηκε η λίστα "
+                        f"χώρων/περιόδων στα φίλτρα: {e}"
+                    )
+                else:
+                    # νέος χώρος/περίοδος να φαίνεται αμέσως στα φίλτρα
+                    list_seasons.clear()
+                    list_sites.clear()
+                    st.success("✅ Το εύρημα αποθηκεύτηκε επιτυχώς!")
+                    st.experimental_rerun()
 
     st.markdown("</div>", unsafe_allow_html=True)
 
 # ------------------------
 # Φόρτωση δεδομένων για πίνακα & χάρτη
 # ------------------------
-df = load_findings()
+st.sidebar.header("Φίλτρα")
+season, site = partition_selector(db)
+df = load_findings(season, site, partition_version(season, site))
 
 st.markdown("<br>", unsafe_allow_html=True)
 
@@ -297,6 +352,34 @@ with col_info:
 
 st.markdown("</div>", unsafe_allow_html=True)
 
+# ------------------------
+# ΕΥΡΗΜΑΤΑ ΚΟΝΤΑ ΣΕ ΣΗΜΕΙΟ (geohash + BallTree)
+# ------------------------
+st.markdown('<div class="finder-card">', unsafe_allow_html=True)
+st.markdown("#### 📍 Ευρήματα κοντά σε σημείο")
+
+near_col1, near_col2, near_col3 = st.columns(3)
+with near_col1:
+    near_lat = st.number_input("Latitude σημείου", format="%.6f", key="near_lat")
+with near_col2:
+    near_lon = st.number_input("Longitude σημείου", format="%.6f", key="near_lon")
+with near_col3:
+    near_radius = st.number_input(
+        "Ακτίνα (μέτρα)", min_value=1.0, value=50.0, step=10.0, key="near_radius"
+    )
+
+if st.button("🔎 Αναζήτηση κοντινών ευρημάτων"):
+    near_df = findings_within_radius(near_lat, near_lon, near_radius)
+    if near_df.empty:
+        st.info("Δεν βρέθηκαν ευρήματα σε αυτή την ακτίνα.")
+    else:
+        st.dataframe(
+            near_df.drop(columns=["image_url", "geohash"], errors="ignore"),
+            use_container_width=True,
+        )
+
+st.markdown("</div>", unsafe_allow_html=True)
+
 # ------------------------
 # ΠΙΝΑΚΑΣ ΕΥΡΗΜΑΤΩΝ
 # ------------------------
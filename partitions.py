@@ -0,0 +1,176 @@
+import argparse
+import re
+from datetime import datetime
+
+import firebase_admin
+import streamlit as st
+from firebase_admin import credentials, firestore
+
+# -----------------------------------------------------
+# PARTITIONS: seasons/{season}/sites/{site}/findings/{id}
+#
+# Κάθε ανασκαφική περίοδος (season) και κάθε χώρος (site) έχουν δική τους
+# υποσυλλογή "findings". Τα ερωτήματα σε πολλά partitions γίνονται με
+# collection_group("findings") (βλ. firestore.indexes.json).
+# -----------------------------------------------------
+ALL_SITES = "Όλοι οι χώροι"
+# set + delete ανά έγγραφο → 400 εγγραφές ανά batch (όριο Firestore: 500)
+MIGRATE_PAGE = 200
+
+
+def active_season() -> str:
+    """Η τρέχουσα περίοδος: από τα secrets ή το τρέχον έτος."""
+    return str(st.secrets.get("active_season", datetime.utcnow().year))
+
+
+def site_key(site_name: str) -> str:
+    key = re.sub(r"[^\w]+", "-", (site_name or "").strip().lower()).strip("-")
+    return key or "unknown"
+
+
+def partition_path(season: str, site: str) -> str:
+    return f"seasons/{season}/sites/{site}/findings"
+
+
+def partition_query(db, season: str, site: str = None):
+    """
+    Ευρήματα ενός partition. Χωρίς site επιστρέφει όλη την περίοδο
+    (collection group + φίλτρο season).
+    """
+    if site:
+        query = db.collection(partition_path(season, site))
+    else:
+        query = db.collection_group("findings").where("season", "==", season)
+    return query.order_by("timestamp", direction=firestore.Query.DESCENDING)
+
+
+def register_partition(db, season: str, site: str, site_name: str):
+    """Κρατάει λίστα από seasons/sites ώστε να φτιάχνονται τα φίλτρα."""
+    batch = db.batch()
+    season_ref = db.collection("seasons").document(season)
+    batch.set(season_ref, {"season": season}, merge=True)
+    batch.set(
+        season_ref.collection("sites").document(site),
+        {"name": site_name or site},
+        merge=True,
+    )
+    batch.commit()
+
+
+# -----------------------------------------------------
+# CACHE ανά partition: κάθε save ανεβάζει την έκδοση μόνο
+# του δικού του partition, τα υπόλοιπα μένουν στην cache.
+# -----------------------------------------------------
+@st.cache_resource
+def _partition_versions():
+    return {}
+
+
+def partition_version(season: str, site: str = None) -> int:
+    versions = _partition_versions()
+    if site:
+        return versions.get((season, site), 0)
+    # η προβολή όλης της περιόδου αλλάζει με οποιοδήποτε site της
+    return sum(v for (s, _), v in versions.items() if s == season)
+
+
+def bump_partition(season: str, site: str):
+    versions = _partition_versions()
+    versions[(season, site)] = versions.get((season, site), 0) + 1
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def list_seasons(_db):
+    seasons = {doc.id for doc in _db.collection("seasons").list_documents()}
+    seasons.add(active_season())
+    return sorted(seasons, reverse=True)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def list_sites(_db, season: str):
+    sites = _db.collection("seasons").document(season).collection("sites").stream()
+    return {doc.id: doc.to_dict().get("name", doc.id) for doc in sites}
+
+
+def partition_selector(db):
+    """
+    Φίλτρα στο sidebar για περίοδο και χώρο. Από προεπιλογή η τρέχουσα
+    περίοδος· οι αρχειοθετημένες φορτώνονται μόνο όταν επιλεγούν.
+    Επιστρέφει (season, site) με site=None για όλους τους χώρους.
+    """
+    seasons = list_seasons(db)
+    season = st.sidebar.selectbox(
+        "Ανασκαφική περίοδος", seasons, index=seasons.index(active_season())
+    )
+    sites = list_sites(db, season)
+    options = [ALL_SITES] + sorted(sites, key=lambda k: sites[k])
+    site = st.sidebar.selectbox(
+        "Αρχαιολογικός χώρος",
+        options,
+        format_func=lambda k: k if k == ALL_SITES else sites[k],
+    )
+    return season, (None if site == ALL_SITES else site)
+
+
+def migrate_flat_findings(db, source: str = "findings") -> int:
+    """
+    Μεταφέρει τα παλιά ευρήματα από τη flat συλλογή στα partitions
+    (season = έτος του timestamp). Διαβάζει σε σελίδες των MIGRATE_PAGE
+    και γράφει κάθε σελίδα με ένα batch. Επιστρέφει πόσα μεταφέρθηκαν.
+    """
+    moved = 0
+    seen = {}
+    while True:
+        # κάθε σελίδα ξαναρωτάει από την αρχή: τα μεταφερμένα έχουν σβηστεί
+        docs = list(db.collection(source).limit(MIGRATE_PAGE).stream())
+        if not docs:
+            break
+
+        batch = db.batch()
+        for doc in docs:
+            d = doc.to_dict()
+            ts = d.get("timestamp")
+            season = str(ts.year) if hasattr(ts, "year") else active_season()
+            site = site_key(d.get("site_name", ""))
+            batch.set(
+                db.collection(partition_path(season, site)).document(doc.id),
+                {**d, "season": season, "site_key": site},
+            )
+            batch.delete(doc.reference)
+            seen[(season, site)] = d.get("site_name", "")
+        batch.commit()
+        moved += len(docs)
+
+    for (season, site), site_name in seen.items():
+        register_partition(db, season, site, site_name)
+    return moved
+
+
+def init_firestore(key_path: str = None):
+    """
+    Firestore client για τα CLI (εκτός Streamlit): από JSON service account
+    ή, αν δεν δοθεί, από το firebase_key του .streamlit/secrets.toml.
+    """
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        cfg = key_path or dict(st.secrets["firebase_key"])
+        firebase_admin.initialize_app(credentials.Certificate(cfg))
+    return firestore.client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Findings partition maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="Move the flat findings collection into partitions")
+    migrate.add_argument("--key", help="Service account JSON (default: .streamlit/secrets.toml)")
+    args = parser.parse_args()
+
+    db = init_firestore(args.key)
+    count = migrate_flat_findings(db)
+    print(f"Migrated {count} findings into seasons/<season>/sites/<site>/findings")
+
+    # τα παλιά ευρήματα δεν έχουν geohash – συμπληρώνεται εδώ
+    from geo_utils import backfill_geohashes
+
+    print(f"Added geohash to {backfill_geohashes(db)} findings")